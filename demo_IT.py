@@ -1,5 +1,6 @@
 from instance_tracker import InstanceCounter, weakref
 import gc
+import logging
 
 # Создаем классы с нашим метаклассом
 class DatabaseConnection(metaclass=InstanceCounter):
@@ -36,7 +37,7 @@ def demo_weakref_advantages():
         print(f"   Создана: {db1.get_metadata()}")
         print(f"   Результат: {db1.execute('SELECT * FROM users')}")
     
-    print(f"   После выхода из контекста - активные: {len(DatabaseConnection.get_active_instances())}")
+    print(f"   После выхода из контекста - активные: {DatabaseConnection.count_active_instances()}")
     
     # Создаем экземпляры без контекстных менеджеров
     print("\n2. Создание экземпляров без контекстных менеджеров:")
@@ -44,19 +45,19 @@ def demo_weakref_advantages():
     cache2 = CacheManager(200)
     uadia1 = UADIA("model_v1")
     
-    print(f"   Активные CacheManager: {len(CacheManager.get_active_instances())}")
-    print(f"   Активные UADIA: {len(UADIA.get_active_instances())}")
+    print(f"   Активные CacheManager: {CacheManager.count_active_instances()}")
+    print(f"   Активные UADIA: {UADIA.count_active_instances()}")
     
     # Демонстрация автоматической очистки
     print("\n3. Автоматическая очистка weakref:")
     def create_temporary_objects():
         temp_db = DatabaseConnection("temp://memory")
         temp_cache = CacheManager(10)
-        print(f"   Внутри функции: {len(DatabaseConnection.get_active_instances())} активных DB")
+        print(f"   Внутри функции: {DatabaseConnection.count_active_instances()} активных DB")
     
     create_temporary_objects()
     gc.collect()
-    print(f"   После функции: {len(DatabaseConnection.get_active_instances())} активных DB")
+    print(f"   После функции: {DatabaseConnection.count_active_instances()} активных DB")
     
     # Статистика
     print("\n4. Детальная статистика:")
@@ -74,7 +75,7 @@ def demo_weakref_advantages():
     # Явное управление памятью
     print("\n5. Явное управление памятью:")
     cache1.close()
-    print(f"   После закрытия cache1: {len(CacheManager.get_active_instances())} активных")
+    print(f"   После закрытия cache1: {CacheManager.count_active_instances()} активных")
     
     # Демонстрация WeakValueDictionary для кэширования
     print("\n6. WeakValueDictionary для кэширования:")
@@ -147,6 +148,55 @@ def demo_observer_pattern():
     
     event_manager.notify("Второе событие")
 
+def demo_object_pool():
+    print("\n=== ПУЛ ОБЪЕКТОВ ===")
+    
+    class PooledConnection(metaclass=InstanceCounter, pooled=True):
+        allocations = 0
+        resets = 0
+        
+        def __new__(cls, *args, **kwargs):
+            # Собственный __new__ вызывается только когда пул пуст
+            cls.allocations += 1
+            return super().__new__(cls)
+        
+        def __init__(self, database_url):
+            self.database_url = database_url
+            self.queries = []
+        
+        def _reset(self):
+            type(self).resets += 1
+            self.queries = None
+    
+    conn = PooledConnection("postgresql://localhost/db1")
+    conn.queries.append("SELECT 1")
+    conn.close()
+    stale = conn
+    del conn
+    
+    reused = PooledConnection("postgresql://localhost/db2")
+    print(f"   Объект взят из пула: {reused is stale}")
+    print(f"   Состояние сброшено и заполнено заново: {reused.queries}, {reused.database_url}")
+    print(f"   Выделений памяти: {PooledConnection.allocations}, сбросов: {PooledConnection.resets}")
+    print(f"   Старая ссылка снова активна: {stale.get_metadata()['is_active']}")
+    assert reused is stale and reused.queries == []
+    assert PooledConnection.allocations == 1 and PooledConnection.resets == 1
+    
+    fresh = PooledConnection("postgresql://localhost/db3")
+    print(f"   Пул пуст - новый объект: {fresh is not reused}, выделений: {PooledConnection.allocations}")
+    assert fresh is not reused and PooledConnection.allocations == 2
+    
+    stats = PooledConnection.get_stats()
+    print(f"   Статистика: создано={stats['total_created']}, "
+          f"удалено={stats['total_deleted']}, активных={stats['active_instances']}")
+    assert (stats['total_created'], stats['total_deleted'], stats['active_instances']) == (3, 1, 2)
+    
+    for obj in [reused, fresh]:
+        obj.close()
+
 if __name__ == "__main__":
+    # Сообщения о создании и закрытии экземпляров выводятся на уровне DEBUG
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
     demo_weakref_advantages()
     demo_observer_pattern()
+    demo_object_pool()
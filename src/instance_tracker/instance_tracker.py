@@ -1,3 +1,8 @@
+import collections
+import contextlib
+import itertools
+import logging
+import time
 import weakref
 from datetime import datetime
 import gc
@@ -9,120 +14,354 @@ import gc
 ✅ Глобальная статистика использования
 ✅ Обнаружение утечек памяти
 '''
+
+_logger = logging.getLogger(__name__)
+
+Metadata = collections.namedtuple(
+    'Metadata', 'id class_name created_at deleted_at is_active')
+
+
+class _TrackedRef(weakref.ref):
+    """Единственная слабая ссылка на экземпляр, общая для всех реестров"""
+    __slots__ = ('_cls', '_key')
+
+
+def _format_ts(ns):
+    # Временные метки хранятся в наносекундах и форматируются только по запросу
+    if ns is None:
+        return None
+    return datetime.fromtimestamp(ns / 1e9).isoformat()
+
+
+def _on_finalize(ref):
+    # Объект уже уничтожен - убираем его ссылку из реестров за O(1).
+    # Заменяет __del__: экземпляр, не закрытый явно, учитывается как удаленный
+    # Номера экземпляров не переиспользуются, поэтому ключ гарантированно
+    # принадлежит этой ссылке и его можно удалять без дополнительных проверок
+    key = ref._key
+    cls = ref._cls
+    if cls._active.pop(key, None) is not None:
+        cls._deleted_count += 1
+        _logger.debug("Закрыт экземпляр %s#%s", cls.__name__, key)
+    cls._instances.pop(key, None)
+
+
+def _make_pooled_new(cls):
+    # Хук _reset ищем один раз при создании класса, а не getattr'ом
+    # со значением по умолчанию при каждом повторном использовании
+    reset = getattr(cls, '_reset', None)
+    # __new__ из тела класса заменяется пулом, но по-прежнему используется
+    # для создания новых экземпляров, когда пул пуст
+    own_new = cls.__dict__.get('__new__')
+    if isinstance(own_new, staticmethod):
+        own_new = own_new.__func__
+    
+    def __new__(klass, *args, **kwargs):
+        klass_pool = klass._instance_pool
+        if klass_pool:
+            self = klass_pool.pop()
+            # Экземпляр получит новый номер - снимаем прежнюю регистрацию
+            old_ref = self._tracked_ref
+            klass._instances.pop(old_ref._key, None)
+            try:
+                del self._metadata
+            except AttributeError:
+                pass
+            if reset is not None:
+                reset(self)
+            return self
+        if own_new is not None:
+            return own_new(klass, *args, **kwargs)
+        parent_new = super(cls, klass).__new__
+        if parent_new is object.__new__:
+            return parent_new(klass)
+        return parent_new(klass, *args, **kwargs)
+    
+    return __new__
+
+
+def _make_constructor(cls):
+    # Конструктор создается для каждого класса отдельно: все часто
+    # используемые объекты становятся переменными замыкания, а проверка
+    # результата __new__ остается только у классов, где он переопределен
+    next_id = cls._id_counter.__next__
+    time_ns = time.time_ns
+    instances = cls._instances
+    active = cls._active
+    log = _logger.debug
+    object_new = object.__new__
+    
+    def track(self, args, kwargs):
+        # Последовательный номер, в отличие от id(self), не переиспользуется
+        self._id = key = next_id()
+        self.created_at = time_ns()
+        self.deleted_at = None
+        # Одна слабая ссылка на экземпляр используется обоими реестрами класса.
+        # Регистрируем до __init__, чтобы внутри него объект уже был активен
+        ref = _TrackedRef(self, _on_finalize)
+        ref._cls = cls
+        ref._key = key
+        self._tracked_ref = ref
+        instances[key] = ref
+        active[key] = ref
+        try:
+            result = self.__init__(*args, **kwargs)
+            # Как и type.__call__, не допускаем __init__, возвращающий значение
+            if result is not None:
+                raise TypeError(
+                    f"__init__() should return None, not '{type(result).__name__}'")
+        except BaseException:
+            active.pop(key, None)
+            instances.pop(key, None)
+            raise
+        # Экземпляр считается созданным только после успешного __init__
+        cls._created_count += 1
+        # logging проверяет уровень до форматирования сообщения
+        log("Создан экземпляр %s#%s", cls.__name__, key)
+        return self
+    
+    if cls.__new__ is object_new:
+        def _construct(*args, **kwargs):
+            return track(object_new(cls), args, kwargs)
+    else:
+        def _construct(*args, **kwargs):
+            self = cls.__new__(cls, *args, **kwargs)
+            if not isinstance(self, cls):
+                return self
+            return track(self, args, kwargs)
+    
+    return _construct
+
+
+class TrackedMixin:
+    """Базовый класс с методами отслеживаемых экземпляров.
+    
+    Методы определены один раз здесь, а InstanceCounter ставит этот класс
+    первым в базы: методы базовых классов пользователя не перекрывают
+    отслеживание, а close() и т.п. из тела класса могут переопределять
+    их и вызывать через super().
+    """
+    __slots__ = ()
+    
+    # Экземпляр активен, пока его номер есть в cls._active - отдельный
+    # флаг на каждом объекте не нужен
+    
+    def __enter__(self):
+        if self._id not in type(self)._active:
+            raise RuntimeError(f"Объект {type(self).__name__}#{self._id} уже закрыт")
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+    
+    def close(self):
+        cls = type(self)
+        if cls._active.pop(self._id, None) is not None:
+            self.deleted_at = time.time_ns()
+            cls._deleted_count += 1
+            _logger.debug("Закрыт экземпляр %s#%s", cls.__name__, self._id)
+            try:
+                metadata = self._metadata
+            except AttributeError:
+                pass
+            else:
+                self._metadata = metadata._replace(
+                    deleted_at=_format_ts(self.deleted_at), is_active=False)
+            # Закрытый экземпляр возвращается в пул для повторного использования
+            pool = cls._instance_pool
+            if pool is not None:
+                pool.append(self)
+    
+    @property
+    def tracker_metadata(self):
+        # Имя выбрано так, чтобы не конфликтовать с атрибутом metadata
+        # пользовательских классов. Кортеж строится при первом обращении и обновляется в close()
+        try:
+            return self._metadata
+        except AttributeError:
+            cls = type(self)
+            metadata = Metadata(
+                self._id,
+                cls.__name__,
+                _format_ts(self.created_at),
+                _format_ts(self.deleted_at),
+                self._id in cls._active
+            )
+            # Кэшируем только зарегистрированный экземпляр: до регистрации
+            # (например, в хуке _reset пула) статус еще изменится
+            if self._id in cls._instances:
+                self._metadata = metadata
+            return metadata
+    
+    def get_metadata(self):
+        metadata = self.tracker_metadata
+        return {
+            'id': metadata.id,
+            'class': metadata.class_name,
+            'created_at': metadata.created_at,
+            'deleted_at': metadata.deleted_at,
+            'is_active': metadata.is_active
+        }
+    
+    def process(self):
+        if self._id not in type(self)._active:
+            raise RuntimeError(f"Объект {type(self).__name__}#{self._id} закрыт")
+        return f"Обработка от {type(self).__name__}#{self._id}"
+    
+    @classmethod
+    def get_active_instances(cls):
+        # Разыменовываем ссылки через map на уровне C, без генератора;
+        # список значений копируем, так как колбэк может изменить словарь
+        instances = map(_TrackedRef.__call__, list(cls._active.values()))
+        return [inst for inst in instances if inst is not None]
+    
+    @classmethod
+    def count_active_instances(cls):
+        # Для подсчета не нужно разыменовывать ссылки и собирать список
+        return len(cls._active)
+    
+    @classmethod
+    def get_stats(cls):
+        active_count = cls.count_active_instances()
+        # Экземпляры в пуле удерживаются намеренно и утечкой не считаются
+        pool = cls._instance_pool
+        pooled_count = len(pool) if pool is not None else 0
+        return {
+            'class_name': cls.__name__,
+            'total_created': cls._created_count,
+            'total_deleted': cls._deleted_count,
+            'active_instances': active_count,
+            'pending_deletion': len(cls._instances) - active_count - pooled_count
+        }
+
+
+_HEAPTYPE = 1 << 9
+
+
+def _has_custom_layout(bases):
+    # Раскладка экземпляра отличается от object, если в иерархии есть
+    # встроенный тип (list, Exception и т.п.) или непустые __slots__
+    for base in bases:
+        for klass in base.__mro__:
+            if klass is object:
+                continue
+            if not klass.__flags__ & _HEAPTYPE:
+                return True
+            slots = klass.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            if any(slot not in ('__dict__', '__weakref__') for slot in slots):
+                return True
+    return False
+
+
 class InstanceCounter(type):
-    _classes_registry = weakref.WeakValueDictionary()
-    _global_instances = weakref.WeakSet()
+    # Классы обычно живут столько же, сколько процесс, поэтому храним их
+    # в обычном словаре; временные классы регистрируются со weak_registry=True
+    _classes_registry = {}
+    _weak_classes_registry = weakref.WeakValueDictionary()
     
-    def __new__(meta, name, bases, namespace):
-        cls = super().__new__(meta, name, bases, namespace)
+    def __new__(meta, name, bases, namespace, pooled=False, pool_size=16,
+                weak_registry=False, **kwargs):
+        if any(issubclass(base, TrackedMixin) for base in bases):
+            cls = super().__new__(meta, name, bases, namespace, **kwargs)
+        else:
+            user_bases = tuple(b for b in bases if b is not object)
+            if _has_custom_layout(user_bases):
+                # Слоты _TrackedBase несовместимы с раскладкой базовых классов
+                # пользователя - служебные атрибуты останутся в __dict__ экземпляра
+                cls = super().__new__(meta, name, (TrackedMixin,) + user_bases, namespace, **kwargs)
+            else:
+                try:
+                    cls = super().__new__(meta, name, (_TrackedBase,) + user_bases, namespace, **kwargs)
+                except TypeError:
+                    # Крайний случай, не распознанный проверкой выше. Конфликт
+                    # раскладки обнаруживается до вызова __init_subclass__, так
+                    # что побочных эффектов еще не было; если дело не в
+                    # раскладке, повторная попытка выбросит ту же ошибку
+                    cls = super().__new__(meta, name, (TrackedMixin,) + user_bases, namespace, **kwargs)
         
-        cls._instances = weakref.WeakSet()
+        # Состояние класса заводим здесь, а не в __init_subclass__: базовый
+        # класс пользователя может не вызывать super().__init_subclass__()
+        cls._instances = {}
+        cls._active = {}
+        # Счетчик выдает последовательные идентификаторы экземпляров
+        cls._id_counter = itertools.count(1)
         cls._created_count = 0
         cls._deleted_count = 0
+        # Размер пула ограничен: при переполнении самый старый закрытый
+        # экземпляр вытесняется и освобождается обычным образом
+        cls._instance_pool = collections.deque(maxlen=pool_size) if pooled else None
         
-        meta._classes_registry[name] = cls
-        
-        original_init = namespace.get('__init__', None)
-        
-        def __init__(self, *args, **kwargs):
-            self._id = id(self)
-            self.created_at = datetime.now().isoformat()
-            self.deleted_at = None
-            self._is_active = True
-            
-            # Вызываем оригинальный __init__ если он существует
-            if original_init:
-                original_init(self, *args, **kwargs)
-            # Иначе вызываем __init__ родительского класса
-            elif bases:
-                super(cls, self).__init__(*args, **kwargs)
-            
-            type(self)._created_count += 1
-            type(self)._instances.add(self)
-            meta._global_instances.add(self)
-            
-            print(f"Создан экземпляр {type(self).__name__}#{self._id}")
-        
-        def __enter__(self):
-            if not self._is_active:
-                raise RuntimeError(f"Объект {type(self).__name__}#{self._id} уже закрыт")
-            return self
-        
-        def __exit__(self, exc_type, exc_val, exc_tb):
-            self.close()
-            return False
-        
-        def close(self):
-            if self._is_active:
-                self._is_active = False
-                self.deleted_at = datetime.now().isoformat()
-                type(self)._deleted_count += 1
-                print(f"Закрыт экземпляр {type(self).__name__}#{self._id}")
-        
-        def get_metadata(self):
-            return {
-                'id': self._id,
-                'class': type(self).__name__,
-                'created_at': self.created_at,
-                'deleted_at': self.deleted_at,
-                'is_active': self._is_active
-            }
+        if pooled:
+            cls.__new__ = _make_pooled_new(cls)
+        cls._construct = staticmethod(_make_constructor(cls))
         
-        def process(self):
-            if not self._is_active:
-                raise RuntimeError(f"Объект {type(self).__name__}#{self._id} закрыт")
-            return f"Обработка от {type(self).__name__}#{self._id}"
-        
-        def __del__(self):
-            if getattr(self, '_is_active', True):
-                self.close()
-        
-        cls.__init__ = __init__
-        cls.__enter__ = __enter__
-        cls.__exit__ = __exit__
-        cls.close = close
-        cls.get_metadata = get_metadata
-        cls.process = process
-        cls.__del__ = __del__
-        
-        @classmethod
-        def get_active_instances(cls):
-            return [inst for inst in cls._instances if getattr(inst, '_is_active', False)]
-        
-        @classmethod
-        def get_stats(cls):
-            active_count = len(cls.get_active_instances())
-            return {
-                'class_name': cls.__name__,
-                'total_created': cls._created_count,
-                'total_deleted': cls._deleted_count,
-                'active_instances': active_count,
-                'pending_deletion': len(cls._instances) - active_count
-            }
-        
-        cls.get_active_instances = get_active_instances
-        cls.get_stats = get_stats
+        if weak_registry:
+            meta._weak_classes_registry[name] = cls
+        else:
+            meta._classes_registry[name] = cls
         
         return cls
     
+    def __call__(cls, *args, **kwargs):
+        # Каждый класс получает свой специализированный конструктор
+        # при создании класса в InstanceCounter.__new__
+        return cls._construct(*args, **kwargs)
+    
+    @classmethod
+    @contextlib.contextmanager
+    def bulk_create(meta):
+        """Отключает циклический сборщик мусора на время массового создания.
+        
+        Внутри блока объекты с циклическими ссылками не освобождаются,
+        поэтому память может расти; при выходе выполняется gc.collect().
+        """
+        was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            yield
+        finally:
+            if was_enabled:
+                gc.enable()
+                gc.collect()
+    
     @classmethod
     def get_all_classes(meta):
-        return list(meta._classes_registry.values())
+        return (list(meta._classes_registry.values())
+                + list(meta._weak_classes_registry.values()))
     
     @classmethod
     def get_global_stats(meta):
-        total_instances = len(meta._global_instances)
+        total_instances = 0
         active_instances = 0
         classes_stats = []
+        classes = meta.get_all_classes()
         
-        for cls in meta.get_all_classes():
-            cls_active = len(cls.get_active_instances())
-            active_instances += cls_active
-            classes_stats.append(cls.get_stats())
+        for cls in classes:
+            # get_stats() уже содержит число активных экземпляров -
+            # не обходим реестр класса второй раз. Берем реализацию
+            # TrackedMixin: пользовательский класс мог переопределить
+            # get_stats обычным методом экземпляра
+            cls_stats = TrackedMixin.get_stats.__func__(cls)
+            total_instances += len(cls._instances)
+            active_instances += cls_stats['active_instances']
+            classes_stats.append(cls_stats)
         
         return {
-            'total_classes': len(meta._classes_registry),
+            'total_classes': len(classes),
             'total_instances': total_instances,
             'active_instances': active_instances,
             'classes': classes_stats
         }
+
+
+class _TrackedBase(TrackedMixin):
+    """Базовый класс со слотами для служебных атрибутов отслеживания.
+    
+    Чтобы экземпляр совсем не имел __dict__, пользовательский класс
+    должен объявить собственные __slots__.
+    """
+    __slots__ = ('_id', 'created_at', 'deleted_at', '_metadata', '_tracked_ref',
+                 '__weakref__')